@@ -5,16 +5,21 @@ A bespoke web UI for managing the AMD AI stack services.
 """
 
 import asyncio
+import os
 import subprocess
+import time
+from collections import deque
 from pathlib import Path
 from typing import Optional
 
 import docker
+import httpx
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
+from starlette.requests import ClientDisconnect
 
 app = FastAPI(title="AMD AI Server Control Panel", version="1.0.0")
 
@@ -97,6 +102,8 @@ SERVICE_APIS = {
         "endpoints": [
             {"method": "POST", "path": "/transcribe", "description": "Transcribe audio file"},
             {"method": "POST", "path": "/transcribe/finetune", "description": "Transcribe with fine-tuned model"},
+            {"method": "POST", "path": "/v1/audio/transcriptions", "description": "OpenAI-compatible transcription"},
+            {"method": "GET", "path": "/transcripts/search", "description": "Full-text search of archived transcripts"},
             {"method": "GET", "path": "/health", "description": "Health check"},
         ],
     },
@@ -121,8 +128,45 @@ SERVICE_APIS = {
             {"method": "GET", "path": "/view", "description": "View generated image"},
         ],
     },
+    "gateway": {
+        "name": "OpenAI Gateway",
+        "base_url": "http://localhost:8090",
+        "docs_url": None,
+        "endpoints": [
+            {"method": "POST", "path": "/v1/audio/transcriptions", "description": "Transcription via Whisper"},
+            {"method": "POST", "path": "/v1/chat/completions", "description": "Chat completion via Ollama"},
+            {"method": "POST", "path": "/v1/audio/speech", "description": "Speech synthesis via Edge TTS"},
+            {"method": "GET", "path": "/api/gateway", "description": "Routes and per-route latency"},
+        ],
+    },
+}
+
+# Gateway routes - OpenAI-compatible paths and the upstream that serves each.
+# The path is forwarded unchanged; override upstreams when running in Docker.
+GATEWAY_ROUTES = {
+    "/v1/audio/transcriptions": {
+        "service": "whisper",
+        "upstream": os.environ.get("GATEWAY_WHISPER_URL", "http://localhost:9000"),
+    },
+    "/v1/chat/completions": {
+        "service": "ollama",
+        "upstream": os.environ.get("GATEWAY_OLLAMA_URL", "http://localhost:11434"),
+    },
+    "/v1/audio/speech": {
+        "service": "edge-tts",
+        "upstream": os.environ.get("GATEWAY_TTS_URL", "http://localhost:8880"),
+    },
+}
+
+# Connection-level headers that must not be forwarded between hops
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host",
 }
 
+# How often a gateway request waiting on its upstream checks that the client is still there
+DISCONNECT_POLL_SECONDS = 0.5
+
 # Compose file path
 COMPOSE_PATH = Path(__file__).parent.parent / "docker-compose.yml"
 
@@ -150,6 +194,10 @@ MCP_CONFIG = {
             "name": "transcribe_clean",
             "description": "Transcribe + clean up via Ollama (fixes punctuation, removes fillers)",
         },
+        {
+            "name": "search_transcripts",
+            "description": "Full-text search over past transcriptions (segments with ms timestamps)",
+        },
         {
             "name": "whisper_health",
             "description": "Check Whisper service status and model info",
@@ -162,6 +210,48 @@ class ServiceAction(BaseModel):
     action: str  # start, stop, restart
 
 
+class RouteStats:
+    """Request counts and latency for one gateway route."""
+
+    def __init__(self, window: int = 1000):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.ttfb = deque(maxlen=window)
+        self.total = deque(maxlen=window)
+
+    def record(self, status: int, ttfb: Optional[float], total: float, size: int = 0):
+        self.requests += 1
+        self.bytes += size
+        if status >= 500:
+            self.errors += 1
+        if ttfb is not None:
+            self.ttfb.append(ttfb)
+        self.total.append(total)
+
+    @staticmethod
+    def _percentiles(samples: deque) -> dict:
+        if not samples:
+            return {"p50_ms": None, "p95_ms": None, "max_ms": None}
+        ordered = sorted(samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+        return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "max_ms": round(ordered[-1] * 1000, 1)}
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "ttfb": self._percentiles(self.ttfb),
+            "total": self._percentiles(self.total),
+        }
+
+
+# Pooled keep-alive clients, one per upstream, created on first use
+upstream_clients: dict = {}
+gateway_stats = {route: RouteStats() for route in GATEWAY_ROUTES}
+
+
 def get_container_status(container_name: str) -> dict:
     """Get status of a specific container."""
     try:
@@ -432,6 +522,136 @@ async def api_services_info():
     return SERVICE_APIS
 
 
+# =============================================================================
+# OpenAI-compatible Gateway
+# =============================================================================
+
+
+def get_upstream_client(base_url: str) -> httpx.AsyncClient:
+    """Get the pooled client for an upstream, creating it on first use."""
+    if base_url not in upstream_clients:
+        upstream_clients[base_url] = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(connect=5.0, read=300.0, write=300.0, pool=30.0),
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=16, keepalive_expiry=60.0),
+        )
+    return upstream_clients[base_url]
+
+
+async def wait_for_disconnect(request: Request, body_sent: asyncio.Event) -> None:
+    """Return once the client has gone away."""
+    # Polling receive() before the body is fully read would swallow body chunks
+    await body_sent.wait()
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+async def proxy_request(route: str, request: Request) -> Response:
+    """
+    Stream a request to its upstream and stream the response back.
+
+    Upstream connections are pooled, so an upstream never sees the end client
+    leave. If the client disconnects before the upstream responds, the
+    upstream request is aborted. Its connection closes, and services that
+    watch for disconnects (Whisper) stop work on it.
+    """
+    target = GATEWAY_ROUTES[route]
+    stats = gateway_stats[route]
+    client = get_upstream_client(target["upstream"])
+    started = time.perf_counter()
+    body_sent = asyncio.Event()
+
+    async def request_body():
+        async for chunk in request.stream():
+            yield chunk
+        body_sent.set()
+
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+    upstream_request = client.build_request(
+        request.method,
+        route,
+        params=request.query_params,
+        headers=headers,
+        content=request_body(),
+    )
+
+    send = asyncio.ensure_future(client.send(upstream_request, stream=True))
+    disconnected = asyncio.ensure_future(wait_for_disconnect(request, body_sent))
+    try:
+        await asyncio.wait({send, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnected.cancel()
+
+    if not send.done():
+        send.cancel()
+        try:
+            await send
+        except (asyncio.CancelledError, httpx.HTTPError):
+            pass
+        # Give the transport a turn to actually close the upstream socket
+        await asyncio.sleep(0)
+        stats.record(499, None, time.perf_counter() - started)
+        return Response(status_code=499)
+
+    try:
+        upstream = send.result()
+    except ClientDisconnect:
+        # Client left mid-upload; httpx has already dropped the half-sent upstream request
+        stats.record(499, None, time.perf_counter() - started)
+        return Response(status_code=499)
+    except httpx.HTTPError as e:
+        stats.record(502, None, time.perf_counter() - started)
+        raise HTTPException(status_code=502, detail=f"{target['service']} unavailable: {e}")
+    ttfb = time.perf_counter() - started
+
+    async def body():
+        size = 0
+        try:
+            async for chunk in upstream.aiter_raw():
+                size += len(chunk)
+                yield chunk
+        finally:
+            await upstream.aclose()
+            stats.record(upstream.status_code, ttfb, time.perf_counter() - started, size)
+
+    response_headers = {
+        k: v for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS
+    }
+    return StreamingResponse(body(), status_code=upstream.status_code, headers=response_headers)
+
+
+@app.post("/v1/audio/transcriptions")
+async def gateway_transcriptions(request: Request):
+    """OpenAI-compatible transcription, served by Whisper."""
+    return await proxy_request("/v1/audio/transcriptions", request)
+
+
+@app.post("/v1/chat/completions")
+async def gateway_chat_completions(request: Request):
+    """OpenAI-compatible chat completion, served by Ollama."""
+    return await proxy_request("/v1/chat/completions", request)
+
+
+@app.post("/v1/audio/speech")
+async def gateway_speech(request: Request):
+    """OpenAI-compatible speech synthesis, served by Edge TTS."""
+    return await proxy_request("/v1/audio/speech", request)
+
+
+@app.get("/api/gateway")
+async def api_gateway():
+    """Get gateway routes and per-route latency statistics."""
+    return {
+        route: {**target, "stats": gateway_stats[route].summary()}
+        for route, target in GATEWAY_ROUTES.items()
+    }
+
+
+@app.on_event("shutdown")
+async def close_upstream_clients():
+    """Close pooled upstream connections."""
+    for client in upstream_clients.values():
+        await client.aclose()
 
 
 if __name__ == "__main__":
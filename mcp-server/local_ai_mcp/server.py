@@ -4,6 +4,7 @@ Provides unified access to local AI services: Whisper STT, Ollama LLM
 """
 
 import os
+import time
 import base64
 import tempfile
 from pathlib import Path
@@ -17,6 +18,14 @@ from mcp.types import Tool, TextContent
 WHISPER_URL = os.environ.get("WHISPER_URL", "http://localhost:9000")
 OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.2")
+WHISPER_TIMEOUT = float(os.environ.get("WHISPER_TIMEOUT", "300"))
+
+# Optional decoding profile shared by the transcription tools; omit it for the server default
+PROFILE_SCHEMA = {
+    "type": "string",
+    "enum": ["fast", "balanced", "accurate"],
+    "description": "Decoding profile: 'fast' (greedy, no fallbacks; quick dictation), 'balanced' (Whisper defaults) or 'accurate' (beam search; slowest). Omit for the server default.",
+}
 
 server = Server("local-ai-mcp")
 
@@ -44,7 +53,8 @@ async def list_tools() -> list[Tool]:
                         "type": "string",
                         "description": "Language code (e.g., 'en', 'he'). Leave empty for auto-detect.",
                         "default": ""
-                    }
+                    },
+                    "profile": PROFILE_SCHEMA
                 },
                 "required": ["audio_base64"]
             }
@@ -68,7 +78,8 @@ async def list_tools() -> list[Tool]:
                         "type": "string",
                         "description": "Language code (e.g., 'en', 'he'). Leave empty for auto-detect.",
                         "default": ""
-                    }
+                    },
+                    "profile": PROFILE_SCHEMA
                 },
                 "required": ["audio_base64"]
             }
@@ -93,6 +104,7 @@ async def list_tools() -> list[Tool]:
                         "description": "Language code (e.g., 'en', 'he'). Leave empty for auto-detect.",
                         "default": ""
                     },
+                    "profile": PROFILE_SCHEMA,
                     "use_finetune": {
                         "type": "boolean",
                         "description": "Use fine-tuned model instead of large-v3-turbo",
@@ -102,6 +114,25 @@ async def list_tools() -> list[Tool]:
                 "required": ["audio_base64"]
             }
         ),
+        Tool(
+            name="search_transcripts",
+            description="Full-text search over previously transcribed audio. Returns matching segments with their position in the source recording (milliseconds)",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Words to find (all must match; end a word with * for prefix match)"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of segments to return (default: 20)",
+                        "default": 20
+                    }
+                },
+                "required": ["query"]
+            }
+        ),
         Tool(
             name="whisper_health",
             description="Check Whisper service health and current model info",
@@ -113,7 +144,7 @@ async def list_tools() -> list[Tool]:
     ]
 
 
-async def call_whisper(audio_base64: str, filename: str, language: str = "", use_finetune: bool = False) -> dict:
+async def call_whisper(audio_base64: str, filename: str, language: str = "", use_finetune: bool = False, profile: str = "") -> dict:
     """Send audio to Whisper API for transcription"""
     # Decode base64 audio
     try:
@@ -137,14 +168,24 @@ async def call_whisper(audio_base64: str, filename: str, language: str = "", use
             data["language"] = language
         if use_finetune:
             data["use_finetune"] = "true"
+        if profile:
+            data["profile"] = profile
 
-        async with httpx.AsyncClient(timeout=300.0) as client:
+        # Tell Whisper when we give up so it can shed or drop the work
+        headers = {"X-Request-Deadline": str(time.time() + WHISPER_TIMEOUT)}
+
+        async with httpx.AsyncClient(timeout=WHISPER_TIMEOUT) as client:
             response = await client.post(
                 f"{WHISPER_URL}/transcribe",
                 files=files,
-                data=data
+                data=data,
+                headers=headers
             )
 
+            if response.status_code == 503:
+                retry_after = response.headers.get("Retry-After", "a few")
+                return {"error": f"Whisper is overloaded, retry in {retry_after} seconds"}
+
             if response.status_code != 200:
                 return {"error": f"Whisper API error: {response.status_code} - {response.text}"}
 
@@ -210,8 +251,9 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         audio_base64 = arguments.get("audio_base64", "")
         filename = arguments.get("filename", "audio.wav")
         language = arguments.get("language", "")
+        profile = arguments.get("profile", "")
 
-        result = await call_whisper(audio_base64, filename, language, use_finetune=False)
+        result = await call_whisper(audio_base64, filename, language, use_finetune=False, profile=profile)
 
         if "error" in result:
             return [TextContent(type="text", text=f"Error: {result['error']}")]
@@ -226,8 +268,9 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         audio_base64 = arguments.get("audio_base64", "")
         filename = arguments.get("filename", "audio.wav")
         language = arguments.get("language", "")
+        profile = arguments.get("profile", "")
 
-        result = await call_whisper(audio_base64, filename, language, use_finetune=True)
+        result = await call_whisper(audio_base64, filename, language, use_finetune=True, profile=profile)
 
         if "error" in result:
             return [TextContent(type="text", text=f"Error: {result['error']}")]
@@ -243,9 +286,10 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         filename = arguments.get("filename", "audio.wav")
         language = arguments.get("language", "")
         use_finetune = arguments.get("use_finetune", False)
+        profile = arguments.get("profile", "")
 
         # First, transcribe
-        result = await call_whisper(audio_base64, filename, language, use_finetune=use_finetune)
+        result = await call_whisper(audio_base64, filename, language, use_finetune=use_finetune, profile=profile)
 
         if "error" in result:
             return [TextContent(type="text", text=f"Error: {result['error']}")]
@@ -271,6 +315,38 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
                  f"---\n**Original (raw):**\n{raw_text}"
         )]
 
+    elif name == "search_transcripts":
+        query = arguments.get("query", "")
+        limit = arguments.get("limit", 20)
+
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            try:
+                response = await client.get(
+                    f"{WHISPER_URL}/transcripts/search", params={"q": query, "limit": limit}
+                )
+            except Exception as e:
+                return [TextContent(type="text", text=f"Failed to connect to Whisper: {e}")]
+
+        if response.status_code != 200:
+            try:
+                error = response.json().get("error", response.status_code)
+            except ValueError:
+                error = f"Whisper API error: {response.status_code}"
+            return [TextContent(type="text", text=f"Error: {error}")]
+
+        results = response.json().get("results", [])
+        if not results:
+            return [TextContent(type="text", text=f"No transcripts match: {query}")]
+
+        lines = [f"**{len(results)} matching segments for '{query}':**\n"]
+        for r in results:
+            source = r.get("filename") or r["audio_hash"][:12]
+            lines.append(
+                f"- {source} (transcript {r['transcript_id']}) "
+                f"[{r['start_ms']}-{r['end_ms']} ms]: {r['text']}"
+            )
+        return [TextContent(type="text", text="\n".join(lines))]
+
     else:
         return [TextContent(type="text", text=f"Unknown tool: {name}")]
 
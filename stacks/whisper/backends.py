@@ -0,0 +1,445 @@
+"""
+Inference backends and routing
+Wraps the ROCm model and an optional quantized CPU model behind a common
+interface, tracks queue depth and measured real-time factor (RTF) for each,
+and routes requests to whichever backend is expected to finish first
+"""
+
+import os
+import threading
+import time
+
+from profiling import instrument_model, start_device_peak, stop_device_peak
+
+# RTF assumed before a backend has served any requests
+DEFAULT_RTF = {"gpu": 0.05, "cpu": 0.4}
+
+# Weight given to the newest measurement in the RTF moving average
+RTF_SMOOTHING = 0.2
+
+
+class RequestCancelled(Exception):
+    """Raised to abandon a request whose deadline passed or whose client went away"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Overloaded(Exception):
+    """Raised when the queue cannot finish a request before its deadline"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def install_cancellation(model, backend) -> None:
+    """
+    Let an in-flight transcription be abandoned
+
+    openai-whisper calls decode() once per 30s window (more with temperature
+    fallback), so wrapping it checks backend.cancel_check between windows.
+    Adapters without torch modules check it themselves between segments
+    """
+    inner = getattr(model, "_model", model)
+    if not hasattr(getattr(inner, "encoder", None), "register_forward_hook"):
+        model.cancel_source = backend
+        return
+
+    decode = inner.decode
+
+    def cancellable_decode(*args, **kwargs):
+        if backend.cancel_check is not None:
+            backend.cancel_check()
+        return decode(*args, **kwargs)
+
+    inner.decode = cancellable_decode
+
+
+class Backend:
+    """A model plus a lock serialising inference on it"""
+
+    def __init__(self, name: str, model, engine: str):
+        self.name = name
+        self.model = model
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.rtf = DEFAULT_RTF.get(name, 0.1)
+        self.requests = 0
+        self.queue_depth = 0
+        self.queued_seconds = 0.0
+        self._stats_lock = threading.Lock()
+        # Profile of the request currently holding the lock, read by model hooks
+        self.active_profile = None
+        self.instrumented = instrument_model(model, self)
+        # Raises RequestCancelled when the current request should stop
+        self.cancel_check = None
+        install_cancellation(model, self)
+
+    @property
+    def device(self) -> str:
+        return str(getattr(self.model, "device", "cpu"))
+
+    def estimated_wait(self, duration: float) -> float:
+        """Seconds until a clip of this length would finish if queued now"""
+        return (self.queued_seconds + duration) * self.rtf
+
+    def admit(self, duration: float, deadline: float = None) -> None:
+        """
+        Raise Overloaded if a clip queued now would miss its deadline (a Unix time)
+
+        A deadline that has already passed (e.g. while waiting for preprocessing)
+        is not overload: that raises RequestCancelled
+        """
+        if deadline is None:
+            return
+        if deadline <= time.time():
+            raise RequestCancelled("deadline")
+        if time.time() + self.estimated_wait(duration) > deadline:
+            raise Overloaded(self.estimated_wait(0))
+
+    def detect_language(self, audio, deadline: float = None) -> str:
+        """Most likely language of the first 30s, detected under the inference lock"""
+        import whisper
+
+        # English-only checkpoints have no language head; transcribe() assumes "en" too
+        if not self.model.is_multilingual:
+            return "en"
+        timeout = -1 if deadline is None else max(0.0, deadline - time.time())
+        if not self.lock.acquire(timeout=timeout):
+            raise RequestCancelled("deadline")
+        meter = start_device_peak(self.device)
+        try:
+            mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=self.model.dims.n_mels)
+            _, probs = self.model.detect_language(mel.to(self.model.device))
+        finally:
+            stop_device_peak(self.device, meter)
+            self.lock.release()
+        return max(probs, key=probs.get)
+
+    def transcribe(self, audio, duration: float, profile=None, deadline: float = None, cancel_check=None, **options) -> dict:
+        with self._stats_lock:
+            self.queue_depth += 1
+            self.queued_seconds += duration
+        try:
+            queued = time.monotonic()
+            # Queued work whose deadline passes while waiting is dropped
+            timeout = -1 if deadline is None else max(0.0, deadline - time.time())
+            if not self.lock.acquire(timeout=timeout):
+                raise RequestCancelled("deadline")
+            try:
+                if cancel_check is not None:
+                    cancel_check()
+                start = time.monotonic()
+                if profile is not None:
+                    profile.spans["queue_wait"] += start - queued
+                    profile.device = self.device
+                meter = start_device_peak(self.device)
+                self.active_profile = profile
+                self.cancel_check = cancel_check
+                try:
+                    result = self.model.transcribe(audio, **options)
+                finally:
+                    self.active_profile = None
+                    self.cancel_check = None
+                    peak, shared = stop_device_peak(self.device, meter)
+                elapsed = time.monotonic() - start
+                if profile is not None:
+                    profile.spans["inference"] += elapsed
+                    profile.peak_device_memory = peak
+                    profile.device_memory_shared = shared
+            finally:
+                self.lock.release()
+        finally:
+            with self._stats_lock:
+                self.queue_depth -= 1
+                self.queued_seconds -= duration
+
+        if duration > 0:
+            with self._stats_lock:
+                rtf = elapsed / duration
+                self.rtf = rtf if self.requests == 0 else (
+                    RTF_SMOOTHING * rtf + (1 - RTF_SMOOTHING) * self.rtf
+                )
+                self.requests += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "engine": self.engine,
+            "device": self.device,
+            "rtf": round(self.rtf, 4),
+            "requests": self.requests,
+            "queue_depth": self.queue_depth,
+        }
+
+
+class Router:
+    """
+    Chooses a backend per request
+
+    Short clips go to whichever backend has the earliest estimated finish
+    time; longer clips stay on the GPU unless its queue is at the overflow
+    limit. Without a GPU every request goes to the CPU backend
+    """
+
+    def __init__(self, gpu: Backend, cpu: Backend = None, cpu_max_seconds: float = 30.0, gpu_queue_limit: int = 2):
+        self.gpu = gpu
+        self.cpu = cpu
+        self.cpu_max_seconds = cpu_max_seconds
+        self.gpu_queue_limit = gpu_queue_limit
+
+    @property
+    def backends(self) -> dict:
+        return {b.name: b for b in (self.gpu, self.cpu) if b is not None}
+
+    def route(self, duration: float, preference: str = "auto") -> Backend:
+        if self.cpu is None:
+            return self.gpu
+        if preference in self.backends:
+            return self.backends[preference]
+        if self.gpu is None or self.gpu.device == "cpu":
+            return self.cpu
+
+        overflow = self.gpu.queue_depth >= self.gpu_queue_limit
+        if duration <= self.cpu_max_seconds or overflow:
+            if self.cpu.estimated_wait(duration) < self.gpu.estimated_wait(duration):
+                return self.cpu
+        return self.gpu
+
+
+class FasterWhisperModel:
+    """Adapter giving a faster-whisper (CTranslate2) model the openai-whisper transcribe() shape"""
+
+    def __init__(self, model_name: str, compute_type: str = "int8", threads: int = 0):
+        from faster_whisper import WhisperModel
+
+        self.device = "cpu"
+        self.cancel_source = None
+        self._model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=threads)
+
+    def _segments(self, segments):
+        # faster-whisper decodes lazily, so checking between segments stops the work
+        for seg in segments:
+            if self.cancel_source is not None and self.cancel_source.cancel_check is not None:
+                self.cancel_source.cancel_check()
+            yield seg
+
+    def transcribe(self, audio, **options) -> dict:
+        # Map openai-whisper option names and "unset" values onto faster-whisper's
+        options.pop("fp16", None)
+        if "logprob_threshold" in options:
+            options["log_prob_threshold"] = options.pop("logprob_threshold")
+        if "beam_size" in options and options["beam_size"] is None:
+            options["beam_size"] = 1
+        if "best_of" in options and options["best_of"] is None:
+            del options["best_of"]
+        segments, info = self._model.transcribe(audio, **options)
+        segments = [
+            {
+                "start": seg.start,
+                "end": seg.end,
+                "text": seg.text,
+                "words": [
+                    {"start": w.start, "end": w.end, "word": w.word}
+                    for w in (seg.words or [])
+                ],
+            }
+            for seg in self._segments(segments)
+        ]
+        return {
+            "text": "".join(seg["text"] for seg in segments),
+            "language": info.language,
+            "segments": segments,
+        }
+
+
+class CpuWhisperModel:
+    """openai-whisper model on CPU with int8 dynamically quantized Linear layers"""
+
+    def __init__(self, model_name: str, threads: int = 0):
+        import torch
+        import whisper
+
+        self.threads = threads
+        model = whisper.load_model(model_name, device="cpu")
+        # whisper's Linear subclass only overrides forward(); quantize_dynamic
+        # matches exact types, so expose the layers as plain nn.Linear first
+        for module in model.modules():
+            if isinstance(module, torch.nn.Linear):
+                module.__class__ = torch.nn.Linear
+        self._model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.device = "cpu"
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def transcribe(self, audio, **options) -> dict:
+        import torch
+
+        options["fp16"] = False
+        if not self.threads:
+            return self._model.transcribe(audio, **options)
+        # torch's thread count is process-wide: apply it only while this decode runs
+        previous = torch.get_num_threads()
+        torch.set_num_threads(self.threads)
+        try:
+            return self._model.transcribe(audio, **options)
+        finally:
+            torch.set_num_threads(previous)
+
+
+def load_cpu_backend(engine: str, model_name: str, threads: int = 0) -> Backend:
+    """Build the CPU backend for the configured engine ("int8" or "ctranslate2")"""
+    if engine == "ctranslate2":
+        return Backend("cpu", FasterWhisperModel(model_name, threads=threads), "ctranslate2-int8")
+    if engine == "int8":
+        return Backend("cpu", CpuWhisperModel(model_name, threads=threads), "torch-int8")
+    raise ValueError(f"Unknown CPU backend: {engine}")
+
+
+def checkpoint_mtime(path: str) -> float:
+    """Modification time of a checkpoint, or None for model names and missing files"""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class ModelVersion:
+    """One loaded checkpoint in a ModelSlot, with a count of requests using it"""
+
+    def __init__(self, version: int, path: str, backend: Backend, mtime: float = None):
+        self.version = version
+        self.path = path
+        self.backend = backend
+        # Checkpoint mtime read before loading, so a file rewritten later can't be confused with these weights
+        self.mtime = mtime
+        self.loaded_at = time.time()
+        self.in_flight = 0
+        self._drained = threading.Condition()
+
+    def release(self) -> None:
+        with self._drained:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._drained.notify_all()
+
+    def wait_drained(self) -> None:
+        with self._drained:
+            self._drained.wait_for(lambda: self.in_flight == 0)
+
+    def free(self) -> None:
+        """Drop the weights and return cached device memory"""
+        import gc
+        import torch
+
+        self.backend.model = None
+        self.backend = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    @property
+    def checkpoint_id(self) -> str:
+        """Identifies the loaded weights: path plus the checkpoint's mtime at load"""
+        return self.path if self.mtime is None else f"{self.path}@{int(self.mtime)}"
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "checkpoint_id": self.checkpoint_id,
+            "loaded_at": self.loaded_at,
+            "in_flight": self.in_flight,
+        }
+
+
+class ModelSlot:
+    """
+    Versioned holder for a hot-swappable model
+
+    Requests acquire() the current version and release() it when done. A swap
+    loads and warms the new checkpoint in the background, points new requests
+    at it in one step, then waits for requests still on the old version to
+    finish before freeing its weights
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.current = None
+        self.status = {"state": "idle"}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        current = self.current
+        return current.backend if current is not None else None
+
+    def acquire(self):
+        """Return the current ModelVersion (or None) with a request counted against it"""
+        with self._lock:
+            current = self.current
+            if current is not None:
+                with current._drained:
+                    current.in_flight += 1
+            return current
+
+    def install(self, path: str, backend: Backend, mtime: float = None) -> tuple:
+        """Make backend the current version; returns (new, old)"""
+        with self._lock:
+            self._version += 1
+            new = ModelVersion(self._version, path, backend, mtime)
+            old, self.current = self.current, new
+        return new, old
+
+    def swap_async(self, path: str, load, warmup, on_retired=None) -> bool:
+        """
+        Start a background swap to the checkpoint at path
+
+        load(path) returns a Backend, warmup(backend) runs it once before it
+        takes traffic, and on_retired(old_version) runs after the old version
+        has drained and been freed. Returns False if a swap is already running
+        """
+        with self._lock:
+            if self.status["state"] in ("loading", "warming", "draining"):
+                return False
+            self.status = {"state": "loading", "target": path, "started_at": time.time()}
+
+        def run():
+            try:
+                mtime = checkpoint_mtime(path)
+                backend = load(path)
+                self._set_state("warming")
+                warmup(backend)
+                new, old = self.install(path, backend, mtime)
+                print(f"{self.name} v{new.version} now serving from {path}")
+                if old is not None:
+                    self._set_state("draining", retiring=old.version)
+                    old.wait_drained()
+                    old.free()
+                    if on_retired is not None:
+                        on_retired(old)
+                    print(f"{self.name} v{old.version} retired")
+                self._set_state("idle", last_swap={"version": new.version, "finished_at": time.time()})
+            except Exception as e:
+                print(f"{self.name} swap to {path} failed: {e}")
+                self._set_state("failed", error=str(e))
+
+        threading.Thread(target=run, name=f"{self.name}-swap", daemon=True).start()
+        return True
+
+    def _set_state(self, state: str, **extra) -> None:
+        with self._lock:
+            self.status = {**self.status, "state": state, **extra}
+            if state in ("idle", "failed"):
+                self.status.pop("retiring", None)
+
+    def info(self) -> dict:
+        current = self.current
+        return {
+            "current": current.info() if current is not None else None,
+            "swap": dict(self.status),
+        }
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Decoding profile benchmark
+Transcribes a sample set with each decoding profile against a running Whisper
+service and reports real-time factor (RTF) and word error rate (WER)
+
+The bundled sample set is samples.jsonl (reference texts). Their audio is
+synthesised once through the stack's TTS service and cached in audio/.
+Synthetic speech is cleaner than real recordings, so WER is optimistic; pass
+--samples DIR with your own recordings (audio files plus same-named .txt
+references) for numbers that reflect your voice and microphone.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --profiles fast accurate --use-finetune
+    python benchmark.py --samples ~/recordings --json results.json
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+HERE = Path(__file__).parent
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".flac", ".ogg", ".opus", ".webm"}
+
+
+def normalize(text: str) -> list:
+    """Lowercase, drop punctuation, split into words"""
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_errors(reference: list, hypothesis: list) -> int:
+    """Word-level Levenshtein distance (substitutions + deletions + insertions)"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def bundled_samples(tts_url: str, voice: str) -> list:
+    """Reference texts from samples.jsonl, synthesising any audio not yet cached"""
+    audio_dir = HERE / "audio"
+    audio_dir.mkdir(exist_ok=True)
+    samples = []
+
+    with open(HERE / "samples.jsonl") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+
+    with httpx.Client(timeout=120.0) as client:
+        for entry in entries:
+            path = audio_dir / f"{entry['id']}.mp3"
+            if not path.exists():
+                print(f"Synthesising {entry['id']}...", file=sys.stderr)
+                response = client.post(
+                    f"{tts_url}/v1/audio/speech",
+                    json={"model": "tts-1", "input": entry["text"], "voice": voice, "response_format": "mp3"},
+                )
+                response.raise_for_status()
+                path.write_bytes(response.content)
+            samples.append({"id": entry["id"], "path": path, "text": entry["text"]})
+    return samples
+
+
+def directory_samples(directory: Path) -> list:
+    """Audio files in a directory that have a same-named .txt reference"""
+    samples = []
+    for path in sorted(directory.iterdir()):
+        reference = path.with_suffix(".txt")
+        if path.suffix.lower() in AUDIO_EXTENSIONS and reference.exists():
+            samples.append({"id": path.stem, "path": path, "text": reference.read_text().strip()})
+    return samples
+
+
+def transcribe(client: httpx.Client, url: str, sample: dict, profile: str, use_finetune: bool) -> dict:
+    with open(sample["path"], "rb") as f:
+        response = client.post(
+            f"{url}/transcribe",
+            files={"file": (sample["path"].name, f)},
+            data={
+                "profile": profile,
+                "restore_punctuation": "false",
+                "use_finetune": str(use_finetune).lower(),
+                "backend": "gpu",
+                "sharded": "false",
+                "debug": "true",
+                # Keep synthetic samples out of the user's transcript archive
+                "archive": "false",
+            },
+        )
+    response.raise_for_status()
+    return response.json()
+
+
+def run_profile(client: httpx.Client, url: str, samples: list, profile: str, use_finetune: bool) -> dict:
+    # Untimed warm-up so the first sample doesn't pay for lazy initialisation
+    transcribe(client, url, samples[0], profile, use_finetune)
+
+    audio_seconds = inference_seconds = wall_seconds = 0.0
+    errors = reference_words = fallbacks = 0
+
+    for sample in samples:
+        started = time.perf_counter()
+        result = transcribe(client, url, sample, profile, use_finetune)
+        wall_seconds += time.perf_counter() - started
+
+        debug = result.get("debug", {})
+        audio_seconds += result["duration"]
+        inference_seconds += debug.get("spans_ms", {}).get("inference", 0) / 1000
+        fallbacks += debug.get("counters", {}).get("temperature_fallbacks", 0)
+
+        reference = normalize(sample["text"])
+        errors += word_errors(reference, normalize(result["text"]))
+        reference_words += len(reference)
+
+    return {
+        "profile": profile,
+        "samples": len(samples),
+        "audio_seconds": round(audio_seconds, 1),
+        "rtf": round(inference_seconds / audio_seconds, 4),
+        "rtf_end_to_end": round(wall_seconds / audio_seconds, 4),
+        "wer": round(errors / reference_words, 4),
+        "temperature_fallbacks": fallbacks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Whisper decoding profiles (RTF and WER)")
+    parser.add_argument("--url", default="http://localhost:9000", help="Whisper service URL")
+    parser.add_argument("--tts-url", default="http://localhost:8880", help="TTS service used to synthesise the bundled samples")
+    parser.add_argument("--voice", default="alloy", help="TTS voice for the bundled samples")
+    parser.add_argument("--samples", type=Path, help="Directory of your own audio files with .txt references")
+    parser.add_argument("--profiles", nargs="+", help="Profiles to run (default: all the service offers)")
+    parser.add_argument("--use-finetune", action="store_true", help="Benchmark the fine-tuned model")
+    parser.add_argument("--json", type=Path, help="Also write results to this file")
+    args = parser.parse_args()
+
+    samples = directory_samples(args.samples) if args.samples else bundled_samples(args.tts_url, args.voice)
+    if not samples:
+        sys.exit("No samples found")
+
+    with httpx.Client(timeout=600.0) as client:
+        profiles = args.profiles or list(client.get(f"{args.url}/profiles").json()["profiles"])
+        results = []
+        for profile in profiles:
+            print(f"Running profile '{profile}' on {len(samples)} samples...", file=sys.stderr)
+            results.append(run_profile(client, args.url, samples, profile, args.use_finetune))
+
+    print(f"\n{'profile':<10} {'RTF':>8} {'RTF e2e':>8} {'WER':>7} {'fallbacks':>10}")
+    for r in results:
+        print(f"{r['profile']:<10} {r['rtf']:>8.4f} {r['rtf_end_to_end']:>8.4f} {r['wer']:>7.2%} {r['temperature_fallbacks']:>10}")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Decoding profiles
+Named sets of openai-whisper transcribe() options trading speed for accuracy.
+Measure them on your hardware with benchmark/benchmark.py
+"""
+
+# Temperatures tried in turn when a window's output looks degenerate
+FALLBACK_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+PROFILES = {
+    # Greedy, single pass, no temperature fallback and no conditioning on the
+    # previous window: lowest latency, for short dictation
+    "fast": {
+        "beam_size": None,
+        "best_of": None,
+        "temperature": 0.0,
+        "condition_on_previous_text": False,
+        "fp16": True,
+        "compression_ratio_threshold": None,
+        "logprob_threshold": None,
+        "no_speech_threshold": 0.6,
+    },
+    # openai-whisper's own defaults: greedy with sampled fallbacks
+    "balanced": {
+        "beam_size": None,
+        "best_of": None,
+        "temperature": FALLBACK_TEMPERATURES,
+        "condition_on_previous_text": True,
+        "fp16": True,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+        "no_speech_threshold": 0.6,
+    },
+    # Beam search plus fallbacks: slowest, fewest errors on hard audio
+    "accurate": {
+        "beam_size": 5,
+        "best_of": 5,
+        "patience": 1.0,
+        "temperature": FALLBACK_TEMPERATURES,
+        "condition_on_previous_text": True,
+        "fp16": True,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+        "no_speech_threshold": 0.6,
+    },
+}
+
+
+def decoding_options(name: str) -> dict:
+    """transcribe() keyword arguments for a profile; raises KeyError for unknown names"""
+    return dict(PROFILES[name])
@@ -0,0 +1,156 @@
+"""
+Audio preprocessing stage
+Decodes uploads with ffmpeg and computes log-mel spectrograms in a process
+pool, outside the inference lock, so the GPU can work on one request while
+the CPU prepares the next. Results come back as memory-mapped files in
+/dev/shm rather than being pickled
+"""
+
+import importlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import whisper
+from whisper.audio import N_SAMPLES, SAMPLE_RATE
+
+# Worker output is written to tmpfs so handing it over is a page mapping, not a copy
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# whisper.transcribe is shadowed by the function of the same name
+_transcribe_module = importlib.import_module("whisper.transcribe")
+_original_log_mel_spectrogram = _transcribe_module.log_mel_spectrogram
+
+
+class PreparedAudio(np.ndarray):
+    """Decoded 16kHz audio carrying its precomputed, padded log-mel spectrogram"""
+
+    # Class-level defaults so slices and views never inherit another array's mel
+    mel = None
+    # Seconds spent in each preparation step: {"ffmpeg": ..., "log_mel": ...}
+    timings = None
+
+    def release(self) -> None:
+        """
+        Drop the mel so it can be unmapped early
+
+        Worker output is a memory map of an already-deleted file, so the
+        mapping goes away by itself once the last view on it is collected
+        """
+        self.mel = None
+
+
+def _log_mel_spectrogram(audio, n_mels=80, padding=0, device=None):
+    """Return the precomputed mel when transcribe() asks for exactly that"""
+    import torch
+
+    mel = getattr(audio, "mel", None)
+    if mel is not None and padding == N_SAMPLES and mel.shape[0] == n_mels:
+        mel = torch.from_numpy(mel)
+        return mel.to(device) if device is not None else mel
+    return _original_log_mel_spectrogram(audio, n_mels, padding, device)
+
+
+# transcribe() calls log_mel_spectrogram itself; let it pick up prepared mels
+_transcribe_module.log_mel_spectrogram = _log_mel_spectrogram
+
+
+def _mel(audio: np.ndarray, n_mels: int, mel_max_seconds: float) -> np.ndarray:
+    """Padded log-mel, or None when it was not asked for or the audio is too long to need it"""
+    if n_mels is None or (mel_max_seconds is not None and len(audio) / SAMPLE_RATE >= mel_max_seconds):
+        return None
+    return _original_log_mel_spectrogram(audio, n_mels, padding=N_SAMPLES).numpy()
+
+
+def _load(path: str, n_mels: int, mel_max_seconds: float) -> tuple:
+    """Decode with ffmpeg and compute the mel; returns (audio, mel, timings)"""
+    started = time.perf_counter()
+    audio = whisper.load_audio(path)
+    decoded = time.perf_counter()
+    mel = _mel(audio, n_mels, mel_max_seconds)
+    timings = {"ffmpeg": decoded - started, "log_mel": time.perf_counter() - decoded}
+    return audio, mel, timings
+
+
+def _decode(path: str, n_mels: int, mel_max_seconds: float) -> tuple:
+    """Decode and compute the mel in a worker, writing both to a file in shared memory"""
+    audio, mel, timings = _load(path, n_mels, mel_max_seconds)
+
+    fd, out = tempfile.mkstemp(prefix="whisper-audio-", dir=SHM_DIR)
+    with os.fdopen(fd, "wb") as f:
+        audio.tofile(f)
+        if mel is not None:
+            mel.tofile(f)
+    return out, audio.shape, mel.shape if mel is not None else None, timings
+
+
+def _attach(path: str, audio_shape: tuple, mel_shape: tuple, timings: dict) -> PreparedAudio:
+    """Map a worker's output; the file is deleted at once and lives only while mapped"""
+    if os.path.getsize(path) == 0:
+        os.unlink(path)
+        audio = np.zeros(0, dtype=np.float32).view(PreparedAudio)
+        audio.timings = timings
+        return audio
+    try:
+        data = np.memmap(path, dtype=np.float32, mode="r+")
+    finally:
+        os.unlink(path)
+    audio = data[: audio_shape[0]].view(PreparedAudio)
+    if mel_shape is not None:
+        audio.mel = np.asarray(data[audio_shape[0]:]).reshape(mel_shape)
+    audio.timings = timings
+    return audio
+
+
+class Preprocessor:
+    """Runs decode + log-mel in worker processes (or inline when workers is 0)"""
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        self.executor = None
+        self._lock = threading.Lock()
+        if workers > 0:
+            self._start()
+
+    def _start(self) -> None:
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        """Replace a pool left broken by a dead worker (e.g. OOM-killed); the first caller wins"""
+        with self._lock:
+            if self.executor is broken:
+                print("Preprocess worker died; restarting the pool")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._start()
+
+    def prepare(self, path: str, n_mels: int = None, mel_max_seconds: float = None) -> PreparedAudio:
+        """
+        Decode audio and, when n_mels is given, its mel
+
+        The mel is skipped for audio of mel_max_seconds or longer, which is
+        bound for the shard pool and would never use it
+        """
+        if self.executor is None:
+            audio, mel, timings = _load(path, n_mels, mel_max_seconds)
+            audio = audio.view(PreparedAudio)
+            audio.mel, audio.timings = mel, timings
+            return audio
+
+        # A worker death fails every job on the pool, so retry once on a fresh
+        # pool; a second failure means this file itself is the problem
+        for attempt in range(2):
+            executor = self.executor
+            try:
+                return _attach(*executor.submit(_decode, path, n_mels, mel_max_seconds).result())
+            except BrokenProcessPool:
+                self._restart(executor)
+                if attempt:
+                    raise
@@ -0,0 +1,253 @@
+"""
+Request profiling and resource accounting
+Per-request timing spans, decoding fallback counts, peak RSS and device
+memory, aggregated across requests, plus an on-demand sampling profiler of
+the live process
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+class RequestProfile:
+    """
+    Timing spans and resource counters for one request
+
+    detailed=True additionally splits inference into encoder and decoder time,
+    which needs a device synchronise around every forward pass
+    """
+
+    def __init__(self, detailed: bool = False, rss_interval: float = 0.05):
+        self.detailed = detailed
+        self.spans = defaultdict(float)
+        self.counters = Counter()
+        self.peak_rss = current_rss()
+        self.peak_device_memory = None
+        self.device_memory_shared = False
+        self.device = None
+        self._started = time.perf_counter()
+        self._marks = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_rss, args=(rss_interval,), daemon=True)
+        self._sampler.start()
+
+    def _sample_rss(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] += time.perf_counter() - start
+
+    def sync(self) -> None:
+        """Wait for queued device work so GPU time lands in the right span"""
+        if self.device and self.device.startswith("cuda"):
+            import torch
+            torch.cuda.synchronize(self.device)
+
+    def start(self, name: str) -> None:
+        self._marks[name] = time.perf_counter()
+
+    def stop(self, name: str) -> None:
+        started = self._marks.pop(name, None)
+        if started is not None:
+            self.spans[name] += time.perf_counter() - started
+
+    def finish(self) -> dict:
+        self._stop.set()
+        self.peak_rss = max(self.peak_rss, current_rss())
+        self.spans["total"] = time.perf_counter() - self._started
+        return self.to_dict()
+
+    def to_dict(self) -> dict:
+        return {
+            "spans_ms": {name: round(sec * 1000, 1) for name, sec in self.spans.items()},
+            "counters": dict(self.counters),
+            "peak_rss_mb": round(self.peak_rss / 2**20, 1),
+            "peak_device_memory_mb": (
+                round(self.peak_device_memory / 2**20, 1) if self.peak_device_memory is not None else None
+            ),
+            "device_memory_shared": self.device_memory_shared,
+        }
+
+
+# CUDA peak-memory counters are per device, but backends with separate locks
+# (standard and fine-tuned models) can decode on the same device at once
+_device_lock = threading.Lock()
+_device_active = defaultdict(int)
+_device_starts = defaultdict(int)
+
+
+def start_device_peak(device: str) -> tuple:
+    """
+    Begin measuring a decode's peak device memory; returns a token for stop_device_peak
+
+    The counter is only reset when no other decode is running on the device,
+    so a concurrent decode's measurement is never wiped
+    """
+    with _device_lock:
+        _device_active[device] += 1
+        _device_starts[device] += 1
+        alone = _device_active[device] == 1
+        if alone and device.startswith("cuda"):
+            import torch
+            torch.cuda.reset_peak_memory_stats(device)
+        return _device_starts[device], alone
+
+
+def stop_device_peak(device: str, token: tuple) -> tuple:
+    """
+    Return (peak bytes or None off-GPU, shared)
+
+    shared is True when another decode overlapped this one; the peak then
+    covers the whole device rather than this request alone
+    """
+    started, alone = token
+    with _device_lock:
+        _device_active[device] -= 1
+        shared = not alone or _device_starts[device] != started
+        if not device.startswith("cuda"):
+            return None, shared
+        import torch
+        return torch.cuda.max_memory_allocated(device), shared
+
+
+def instrument_model(model, backend) -> bool:
+    """
+    Attach profiling hooks to an openai-whisper model
+
+    Encoder/decoder forward hooks and a decode() wrapper report into
+    backend.active_profile, which the backend sets while it holds its lock.
+    Returns False for models without torch modules (e.g. CTranslate2)
+    """
+    model = getattr(model, "_model", model)
+    encoder = getattr(model, "encoder", None)
+    if encoder is None or not hasattr(encoder, "register_forward_hook"):
+        return False
+
+    for name, module in (("encoder", model.encoder), ("decoder", model.decoder)):
+        def pre_hook(module, args, name=name):
+            profile = backend.active_profile
+            if profile is not None and profile.detailed:
+                profile.sync()
+                profile.start(name)
+
+        def post_hook(module, args, output, name=name):
+            profile = backend.active_profile
+            if profile is not None and profile.detailed:
+                profile.sync()
+                profile.stop(name)
+
+        module.register_forward_pre_hook(pre_hook)
+        module.register_forward_hook(post_hook)
+
+    # transcribe() retries a window at increasing temperatures when the
+    # output looks degenerate; every decode above temperature 0 is a fallback
+    decode = model.decode
+
+    def counting_decode(mel, options=None, **kwargs):
+        profile = backend.active_profile
+        if profile is not None:
+            profile.counters["decode_calls"] += 1
+            if options is not None and options.temperature > 0:
+                profile.counters["temperature_fallbacks"] += 1
+        return decode(mel, options, **kwargs) if options is not None else decode(mel, **kwargs)
+
+    model.decode = counting_decode
+    return True
+
+
+class StatsAggregator:
+    """Rolling per-span latency and counter totals across requests"""
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self.requests = 0
+        self.spans = defaultdict(lambda: deque(maxlen=self.window))
+        self.counters = Counter()
+        self.peak_rss = 0
+        self.peak_device_memory = 0
+        self._lock = threading.Lock()
+
+    def record(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self.requests += 1
+            for name, sec in profile.spans.items():
+                self.spans[name].append(sec)
+            self.counters.update(profile.counters)
+            self.peak_rss = max(self.peak_rss, profile.peak_rss)
+            if profile.peak_device_memory:
+                self.peak_device_memory = max(self.peak_device_memory, profile.peak_device_memory)
+
+    def count(self, name: str) -> None:
+        """Bump a counter for an event outside a normal request (e.g. a shed request)"""
+        with self._lock:
+            self.counters[name] += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            spans = {}
+            for name, samples in self.spans.items():
+                ordered = sorted(samples)
+                pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+                spans[name] = {
+                    "count": len(ordered),
+                    "mean_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+                    "p50_ms": pick(0.5),
+                    "p95_ms": pick(0.95),
+                    "max_ms": round(ordered[-1] * 1000, 1),
+                }
+            return {
+                "requests": self.requests,
+                "window": self.window,
+                "spans": spans,
+                "counters": dict(self.counters),
+                "peak_rss_mb": round(self.peak_rss / 2**20, 1),
+                "peak_device_memory_mb": round(self.peak_device_memory / 2**20, 1),
+                "current_rss_mb": round(current_rss() / 2**20, 1),
+            }
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> str:
+    """
+    Sample every thread's Python stack for the given duration
+
+    Returns collapsed stacks ("frame;frame;frame count" per line, hottest
+    first), the input format of flamegraph.pl and speedscope
+    """
+    me = threading.get_ident()
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stacks[";".join(reversed(names))] += 1
+        time.sleep(interval)
+
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
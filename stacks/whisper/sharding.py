@@ -0,0 +1,232 @@
+"""
+Sharded transcription for long audio
+Splits audio at silence points into overlapping shards, transcribes them in
+parallel across a process pool of model replicas, then stitches the results
+back together with de-duplicated overlaps and global timestamps
+"""
+
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Per-process model replica, populated by _init_replica
+_replica = None
+
+
+def _init_replica(model_source: str, device_queue, threads: int) -> None:
+    """Load one model replica inside a pool worker"""
+    global _replica
+    import torch
+    import whisper
+
+    # Each worker would otherwise use every core, so N CPU replicas oversubscribe
+    torch.set_num_threads(threads)
+    device = device_queue.get()
+    _replica = whisper.load_model(model_source, device=device)
+    print(f"Shard replica loaded: {model_source} on {device}")
+
+
+def _transcribe_shard(audio: np.ndarray, options: dict) -> dict:
+    """Transcribe a single shard on this worker's replica"""
+    result = _replica.transcribe(audio, word_timestamps=True, **options)
+    return {
+        "language": result.get("language"),
+        "segments": [
+            {
+                "start": seg["start"],
+                "end": seg["end"],
+                "text": seg["text"],
+                "words": [
+                    {"start": w["start"], "end": w["end"], "word": w["word"]}
+                    for w in seg.get("words", [])
+                ],
+            }
+            for seg in result.get("segments", [])
+        ],
+    }
+
+
+def replica_devices(device: str, replicas: int) -> list:
+    """Assign a device to each replica, spreading GPU replicas across visible devices"""
+    if device == "cpu":
+        return ["cpu"] * replicas
+
+    import torch
+
+    count = torch.cuda.device_count() if torch.cuda.is_available() else 0
+    if count == 0:
+        return ["cpu"] * replicas
+    return [f"cuda:{i % count}" for i in range(replicas)]
+
+
+class ShardPool:
+    """Process pool holding one Whisper replica per worker"""
+
+    def __init__(self, model_source: str, replicas: int, device: str = "cpu", threads: int = 0):
+        self.model_source = model_source
+        self.replicas = replicas
+        self.devices = replica_devices(device, replicas)
+        self.threads = threads or max(1, (os.cpu_count() or 1) // replicas)
+        self._lock = threading.Lock()
+        self._start()
+
+    def _start(self) -> None:
+        # CUDA/ROCm cannot be re-initialised in a forked child
+        ctx = multiprocessing.get_context("spawn")
+        device_queue = ctx.Queue()
+        for d in self.devices:
+            device_queue.put(d)
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.replicas,
+            mp_context=ctx,
+            initializer=_init_replica,
+            initargs=(self.model_source, device_queue, self.threads),
+        )
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        """Replace a pool left broken by a dead replica (e.g. OOM-killed); the first caller wins"""
+        with self._lock:
+            if self.executor is broken:
+                print(f"Shard replica of {self.model_source} died; restarting the pool")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._start()
+
+    def transcribe(self, audio: np.ndarray, options: dict, shard_seconds: float, overlap_seconds: float) -> dict:
+        """Transcribe audio across the pool and merge the shard results"""
+        shards = plan_shards(audio, shard_seconds, overlap_seconds)
+        # A replica death fails every job on the pool: retry once on a fresh pool
+        for attempt in range(2):
+            executor = self.executor
+            try:
+                futures = [
+                    executor.submit(_transcribe_shard, np.asarray(audio[start:end]), options)
+                    for start, end in shards
+                ]
+                results = [f.result() for f in futures]
+                break
+            except BrokenProcessPool:
+                self._restart(executor)
+                if attempt:
+                    raise
+        return merge_shards(shards, results)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _frame_energy(audio: np.ndarray, frame: int) -> np.ndarray:
+    """RMS energy of non-overlapping frames"""
+    n = len(audio) // frame
+    frames = audio[: n * frame].reshape(n, frame)
+    return np.sqrt(np.mean(frames ** 2, axis=1))
+
+
+def find_split_point(audio: np.ndarray, target: int, search: int, frame: int = SAMPLE_RATE // 50) -> int:
+    """Return the sample index of the quietest frame within +/- search of target"""
+    lo = max(0, target - search)
+    hi = min(len(audio), target + search)
+    if hi - lo < frame:
+        return target
+
+    energy = _frame_energy(audio[lo:hi], frame)
+    # Smooth over ~200ms so a split lands in a pause rather than a single quiet frame
+    width = min(len(energy), 10)
+    smoothed = np.convolve(energy, np.ones(width) / width, mode="same")
+    return lo + int(np.argmin(smoothed)) * frame + frame // 2
+
+
+def plan_shards(audio: np.ndarray, shard_seconds: float, overlap_seconds: float) -> list:
+    """
+    Split audio into overlapping (start, end) sample ranges
+
+    Boundaries are placed at the quietest point near each multiple of
+    shard_seconds; every shard then extends half the overlap either side of
+    its boundary so words cut at the split are seen whole by one replica
+    """
+    total = len(audio)
+    shard_len = int(shard_seconds * SAMPLE_RATE)
+    half_overlap = int(overlap_seconds * SAMPLE_RATE / 2)
+    search = shard_len // 10
+
+    boundaries = [0]
+    while total - boundaries[-1] > shard_len + search:
+        boundaries.append(find_split_point(audio, boundaries[-1] + shard_len, search))
+    boundaries.append(total)
+
+    shards = []
+    for i in range(len(boundaries) - 1):
+        start = boundaries[i] - half_overlap if i > 0 else 0
+        end = boundaries[i + 1] + half_overlap if i < len(boundaries) - 2 else total
+        shards.append((max(0, start), min(total, end)))
+    return shards
+
+
+def _norm(word: str) -> str:
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def _drop_repeated_prefix(kept: list, incoming: list, max_words: int = 8) -> list:
+    """Drop leading words of incoming that repeat the tail of kept (timestamp jitter at a seam)"""
+    tail = [_norm(w["word"]) for w in kept[-max_words:]]
+    head = [_norm(w["word"]) for w in incoming[:max_words]]
+    for n in range(min(len(tail), len(head)), 0, -1):
+        if tail[-n:] == head[:n]:
+            return incoming[n:]
+    return incoming
+
+
+def merge_shards(shards: list, results: list) -> dict:
+    """
+    Merge per-shard results into one transcription
+
+    Each shard owns the time between the midpoints of its overlaps with its
+    neighbours; words outside that window are dropped, and any remaining
+    repetition across the seam is removed by matching word sequences
+    """
+    segments = []
+    all_words = []
+    languages = []
+
+    for i, ((start, end), result) in enumerate(zip(shards, results)):
+        offset = start / SAMPLE_RATE
+        lo = (start + shards[i - 1][1]) / 2 / SAMPLE_RATE if i > 0 else 0.0
+        hi = (end + shards[i + 1][0]) / 2 / SAMPLE_RATE if i < len(shards) - 1 else float("inf")
+        if result.get("language"):
+            languages.append(result["language"])
+
+        for seg in result["segments"]:
+            words = [
+                {"start": w["start"] + offset, "end": w["end"] + offset, "word": w["word"]}
+                for w in seg["words"]
+            ]
+            words = [w for w in words if lo <= (w["start"] + w["end"]) / 2 < hi]
+            if not segments or segments[-1]["shard"] != i:
+                words = _drop_repeated_prefix(all_words, words)
+            if not words:
+                continue
+
+            all_words.extend(words)
+            segments.append({
+                "shard": i,
+                "start": round(words[0]["start"], 3),
+                "end": round(words[-1]["end"], 3),
+                "text": "".join(w["word"] for w in words),
+            })
+
+    for seg in segments:
+        del seg["shard"]
+
+    return {
+        "text": "".join(seg["text"] for seg in segments),
+        "language": max(set(languages), key=languages.count) if languages else None,
+        "segments": segments,
+        "shards": len(shards),
+    }
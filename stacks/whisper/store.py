@@ -0,0 +1,183 @@
+"""
+Transcript store
+Persists transcripts and their segments in SQLite with an FTS5 index over
+segment text. Each is keyed by a hash of the audio plus the model, profile and
+language that produced it, so re-transcribing a file replaces its old entry
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    audio_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    requested_language TEXT NOT NULL,
+    language TEXT,
+    duration_ms INTEGER,
+    filename TEXT,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (audio_hash, model, profile, requested_language)
+);
+
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    transcript_id INTEGER NOT NULL REFERENCES transcripts(id) ON DELETE CASCADE,
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS segments_by_transcript ON segments (transcript_id, start_ms);
+
+-- External-content index: segment text is stored once, in segments
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5 (
+    text, content='segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fts_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 query matching all of its words
+
+    Each word is quoted so punctuation and FTS operators in user input can't
+    produce a syntax error; a trailing * keeps prefix search available
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class TranscriptStore:
+    """SQLite transcript archive; one connection per thread, WAL for concurrent readers"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30.0)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA foreign_keys=ON")
+            self._local.db = db
+        return db
+
+    def transcript(self, transcript_id: int) -> dict:
+        db = self._connect()
+        row = db.execute("SELECT * FROM transcripts WHERE id = ?", (transcript_id,)).fetchone()
+        return self._with_segments(db, row) if row else None
+
+    def _with_segments(self, db: sqlite3.Connection, row: sqlite3.Row) -> dict:
+        transcript = dict(row)
+        transcript["segments"] = [
+            dict(seg) for seg in db.execute(
+                "SELECT start_ms, end_ms, text FROM segments WHERE transcript_id = ? ORDER BY start_ms",
+                (row["id"],),
+            )
+        ]
+        return transcript
+
+    def put(
+        self,
+        audio_hash: str,
+        model: str,
+        profile: str,
+        requested_language: str,
+        result: dict,
+        duration: float,
+        filename: str = None,
+    ) -> int:
+        """Store a transcription result (replacing any earlier one for the same key); returns its id"""
+        segments = [
+            (int(seg["start"] * 1000), int(seg["end"] * 1000), seg["text"].strip())
+            for seg in result.get("segments", [])
+        ]
+        db = self._connect()
+        # One transaction per transcript keeps ingest fast and the index consistent
+        with self._write_lock, db:
+            db.execute(
+                "DELETE FROM transcripts WHERE audio_hash = ? AND model = ? AND profile = ? AND requested_language = ?",
+                (audio_hash, model, profile, requested_language or ""),
+            )
+            cursor = db.execute(
+                "INSERT INTO transcripts (audio_hash, model, profile, requested_language, language,"
+                " duration_ms, filename, text, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    audio_hash, model, profile, requested_language or "", result.get("language"),
+                    int(duration * 1000), filename, result["text"].strip(), time.time(),
+                ),
+            )
+            transcript_id = cursor.lastrowid
+            db.executemany(
+                "INSERT INTO segments (transcript_id, start_ms, end_ms, text) VALUES (?, ?, ?, ?)",
+                [(transcript_id, *seg) for seg in segments],
+            )
+        return transcript_id
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """Segments matching all words of query, best match first"""
+        match = fts_query(query)
+        if not match:
+            return []
+        db = self._connect()
+        rows = db.execute(
+            """
+            SELECT s.transcript_id, s.start_ms, s.end_ms, s.text,
+                   snippet(segments_fts, 0, '[', ']', '...', 16) AS snippet,
+                   t.audio_hash, t.filename, t.language, t.created_at
+            FROM segments_fts
+            JOIN segments s ON s.id = segments_fts.rowid
+            JOIN transcripts t ON t.id = s.transcript_id
+            WHERE segments_fts MATCH ?
+            ORDER BY segments_fts.rank
+            LIMIT ?
+            """,
+            (match, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def stats(self) -> dict:
+        db = self._connect()
+        row = db.execute(
+            "SELECT COUNT(*) AS transcripts, COALESCE(SUM(duration_ms), 0) AS duration_ms FROM transcripts"
+        ).fetchone()
+        segments = db.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        return {
+            "transcripts": row["transcripts"],
+            "segments": segments,
+            "hours": round(row["duration_ms"] / 3_600_000, 2),
+        }
@@ -0,0 +1,174 @@
+"""
+Streaming dictation
+Rolling-buffer transcription of live PCM audio using a local-agreement
+policy: a word is committed once two consecutive decodes of the buffer agree
+on it, and committed audio is trimmed from the buffer so only the unstable
+tail is re-decoded
+"""
+
+import re
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def _norm(word: str) -> str:
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def pcm16_to_float(data: bytes, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Convert little-endian 16-bit mono PCM to float32 at 16kHz"""
+    audio = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+    if sample_rate != SAMPLE_RATE and len(audio):
+        n = int(len(audio) * SAMPLE_RATE / sample_rate)
+        audio = np.interp(
+            np.linspace(0, len(audio) - 1, n), np.arange(len(audio)), audio
+        ).astype(np.float32)
+    return audio
+
+
+class LocalAgreement:
+    """Commits the longest common prefix of consecutive hypotheses"""
+
+    def __init__(self):
+        self.previous = []
+        self.committed_end = 0.0
+        self.committed_tail = []
+
+    def insert(self, words: list) -> tuple:
+        """Add a new hypothesis (absolute word timings); return (committed, unstable) words"""
+        # Only words past the commit point are still in play
+        words = [w for w in words if w["start"] >= self.committed_end - 0.1]
+
+        # Drop a leading repeat of already-committed words
+        tail = [_norm(w["word"]) for w in self.committed_tail]
+        head = [_norm(w["word"]) for w in words[:5]]
+        for n in range(min(len(tail), len(head)), 0, -1):
+            if tail[-n:] == head[:n]:
+                words = words[n:]
+                break
+
+        committed = []
+        for prev, new in zip(self.previous, words):
+            if _norm(prev["word"]) != _norm(new["word"]):
+                break
+            committed.append(new)
+
+        unstable = words[len(committed):]
+        self.previous = unstable
+        if committed:
+            self.committed_end = committed[-1]["end"]
+            self.committed_tail = (self.committed_tail + committed)[-5:]
+        return committed, unstable
+
+    def flush(self) -> list:
+        """Commit whatever is left of the last hypothesis"""
+        words, self.previous = self.previous, []
+        if words:
+            self.committed_end = words[-1]["end"]
+        return words
+
+
+class DictationSession:
+    """
+    One live dictation stream
+
+    Audio accumulates until min_chunk_seconds of new samples arrive, then the
+    buffer is decoded. Once the buffer is longer than trim_seconds it is cut
+    at the last committed word; max_buffer_seconds bounds it even when nothing
+    commits, so memory and per-decode cost stay flat however long the session
+    """
+
+    def __init__(
+        self,
+        transcribe,
+        options: dict = None,
+        min_chunk_seconds: float = 1.0,
+        trim_seconds: float = 8.0,
+        max_buffer_seconds: float = 20.0,
+        prompt_chars: int = 200,
+    ):
+        self.transcribe = transcribe
+        self.options = dict(options or {})
+        self.min_chunk = int(min_chunk_seconds * SAMPLE_RATE)
+        self.trim_samples = int(trim_seconds * SAMPLE_RATE)
+        self.max_samples = int(max_buffer_seconds * SAMPLE_RATE)
+        self.prompt_chars = prompt_chars
+
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.offset = 0.0  # stream time of buffer[0], seconds
+        self.pending = 0
+        self.prompt = ""
+        self.agreement = LocalAgreement()
+
+    def feed(self, audio: np.ndarray) -> list:
+        """Append audio; return events produced by a decode, if one was due"""
+        self.buffer = np.concatenate([self.buffer, audio])
+        self.pending += len(audio)
+        if self.pending < self.min_chunk:
+            return []
+        self.pending = 0
+        return self._decode()
+
+    def finish(self) -> list:
+        """Decode remaining audio and commit everything"""
+        events = self._decode() if self.pending else []
+        words = self.agreement.flush()
+        if words:
+            events.append(self._committed(words))
+        events.append({"type": "final"})
+        return events
+
+    def _decode(self) -> list:
+        duration = len(self.buffer) / SAMPLE_RATE
+        result = self.transcribe(self.buffer, duration, **{
+            **self.options,
+            "word_timestamps": True,
+            "condition_on_previous_text": False,
+            "initial_prompt": self.prompt or None,
+        })
+        if "language" not in self.options and result.get("language"):
+            self.options["language"] = result["language"]
+
+        words = [
+            {"start": w["start"] + self.offset, "end": w["end"] + self.offset, "word": w["word"]}
+            for seg in result.get("segments", [])
+            for w in seg.get("words", [])
+        ]
+        committed, unstable = self.agreement.insert(words)
+
+        events = []
+        if committed:
+            events.append(self._committed(committed))
+        if len(self.buffer) > self.max_samples:
+            # Nothing agreed for too long: accept the current hypothesis
+            forced = self.agreement.flush()
+            if forced:
+                events.append(self._committed(forced))
+            unstable = []
+        events.append({"type": "partial", "text": "".join(w["word"] for w in unstable).strip()})
+
+        self._trim()
+        return events
+
+    def _committed(self, words: list) -> dict:
+        text = "".join(w["word"] for w in words)
+        self.prompt = (self.prompt + text)[-self.prompt_chars:]
+        return {
+            "type": "committed",
+            "text": text.strip(),
+            "start": round(words[0]["start"], 3),
+            "end": round(words[-1]["end"], 3),
+        }
+
+    def _trim(self) -> None:
+        if len(self.buffer) <= self.trim_samples:
+            return
+        cut = int((self.agreement.committed_end - self.offset) * SAMPLE_RATE)
+        if len(self.buffer) > self.max_samples:
+            cut = max(cut, len(self.buffer) - self.trim_samples)
+        cut = min(max(cut, 0), len(self.buffer))
+        if cut:
+            self.buffer = self.buffer[cut:]
+            self.offset += cut / SAMPLE_RATE
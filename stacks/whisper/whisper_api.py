@@ -1,44 +1,163 @@
 """
 Whisper STT API Server
 GPU-accelerated speech-to-text with optional punctuation restoration
-Supports both standard model and custom fine-tuned model
+Supports both standard model and custom fine-tuned model, with an optional
+quantized CPU backend for short clips and GPU overflow
 """
 
+import hmac
+import json
+import math
 import os
+import select
+import socket
 import tempfile
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
+import numpy as np
+import torch
 import whisper
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from flask_sock import Sock
+
+from backends import Backend, ModelSlot, Overloaded, RequestCancelled, Router, checkpoint_mtime, load_cpu_backend
+from decoding import PROFILES, decoding_options
+from preprocess import Preprocessor
+from profiling import RequestProfile, StatsAggregator, sample_stacks
+from sharding import ShardPool, SAMPLE_RATE
+from store import TranscriptStore, hash_file
+from streaming import DictationSession, pcm16_to_float
 
 app = Flask(__name__)
-CORS(app)
+# Browser pages may call the API, but never /admin: without this any open tab
+# could make the service load an arbitrary checkpoint
+CORS(app, resources={r"^(?!/admin/).*": {"origins": "*"}})
+sock = Sock(app)
 
 # Load models on startup
 MODEL_NAME = os.environ.get("WHISPER_MODEL", "large-v3-turbo")
 FINETUNE_MODEL_PATH = os.environ.get("WHISPER_FINETUNE_MODEL", "")
 DEFAULT_LANGUAGE = os.environ.get("WHISPER_LANGUAGE", None)
 
-# Load standard model
-print(f"Loading Whisper model: {MODEL_NAME}")
-model = whisper.load_model(MODEL_NAME)
-print(f"Model loaded successfully on device: {model.device}")
+# Decoding profile used when a request doesn't name one (see decoding.py)
+DEFAULT_PROFILE = os.environ.get("WHISPER_DEFAULT_PROFILE", "balanced")
+STREAM_PROFILE = os.environ.get("WHISPER_STREAM_PROFILE", "fast")
+
+# Sharded transcription of long audio (0 replicas = disabled)
+SHARD_REPLICAS = int(os.environ.get("WHISPER_SHARD_REPLICAS", "0"))
+SHARD_DEVICE = os.environ.get("WHISPER_SHARD_DEVICE", "cpu")
+SHARD_SECONDS = float(os.environ.get("WHISPER_SHARD_SECONDS", "300"))
+SHARD_OVERLAP = float(os.environ.get("WHISPER_SHARD_OVERLAP", "4"))
+SHARD_MIN_SECONDS = float(os.environ.get("WHISPER_SHARD_MIN_SECONDS", "900"))
+# Torch threads per replica (0 = split the machine's cores evenly between replicas)
+SHARD_THREADS = int(os.environ.get("WHISPER_SHARD_THREADS", "0"))
+
+# Quantized CPU backend ("" = disabled, "int8" = torch dynamic quantization,
+# "ctranslate2" = faster-whisper) and routing thresholds
+CPU_BACKEND = os.environ.get("WHISPER_CPU_BACKEND", "")
+CPU_MODEL_NAME = os.environ.get("WHISPER_CPU_MODEL") or MODEL_NAME
+CPU_THREADS = int(os.environ.get("WHISPER_CPU_THREADS", "0"))
+CPU_MAX_SECONDS = float(os.environ.get("WHISPER_CPU_MAX_SECONDS", "30"))
+GPU_QUEUE_LIMIT = int(os.environ.get("WHISPER_GPU_QUEUE_LIMIT", "2"))
+
+# Decode/log-mel worker processes (0 = prepare inline in the request thread)
+PREPROCESS_WORKERS = int(os.environ.get("WHISPER_PREPROCESS_WORKERS", "2"))
+
+# Deadline applied when a client sends no X-Request-Deadline header, seconds
+DEFAULT_TIMEOUT = float(os.environ.get("WHISPER_DEFAULT_TIMEOUT", "300"))
 
-# Load fine-tuned model if path provided
-finetune_model = None
+# Bearer token required by /admin endpoints (empty = admin endpoints disabled)
+ADMIN_TOKEN = os.environ.get("WHISPER_ADMIN_TOKEN", "")
+
+# Longest /debug/profile capture allowed, seconds
+PROFILE_MAX_SECONDS = float(os.environ.get("WHISPER_PROFILE_MAX_SECONDS", "60"))
+
+# SQLite transcript archive with full-text search (empty = disabled)
+TRANSCRIPT_DB = os.environ.get("WHISPER_TRANSCRIPT_DB", "/app/data/transcripts.db")
+
+# Live dictation: decode interval and rolling buffer bounds (seconds)
+STREAM_CHUNK_SECONDS = float(os.environ.get("WHISPER_STREAM_CHUNK_SECONDS", "1.0"))
+STREAM_TRIM_SECONDS = float(os.environ.get("WHISPER_STREAM_TRIM_SECONDS", "8"))
+STREAM_MAX_SECONDS = float(os.environ.get("WHISPER_STREAM_MAX_SECONDS", "20"))
+# Concurrent dictation sessions. Each holds a gunicorn thread (8) while open,
+# so keep this below the thread count to leave room for /transcribe and /health
+STREAM_MAX_SESSIONS = int(os.environ.get("WHISPER_STREAM_MAX_SESSIONS", "4"))
+
+# Load CPU backend if configured
+cpu_backend = None
+if CPU_BACKEND:
+    print(f"Loading CPU backend ({CPU_BACKEND}): {CPU_MODEL_NAME}")
+    try:
+        cpu_backend = load_cpu_backend(CPU_BACKEND, CPU_MODEL_NAME, CPU_THREADS)
+        print("CPU backend loaded")
+    except Exception as e:
+        print(f"Failed to load CPU backend: {e}")
+
+# Load standard model. Without a GPU it would only be a slower fp32 copy of
+# the CPU backend's model, so it is skipped when a CPU backend is available
+model = None
+if torch.cuda.is_available() or cpu_backend is None:
+    print(f"Loading Whisper model: {MODEL_NAME}")
+    model = whisper.load_model(MODEL_NAME)
+    print(f"Model loaded successfully on device: {model.device}")
+else:
+    print("No GPU available: serving the standard model from the CPU backend")
+
+# Load fine-tuned model if path provided. It lives in a versioned slot so a
+# new checkpoint can be swapped in via /admin/finetune without a restart
+finetune_slot = ModelSlot("finetune")
 if FINETUNE_MODEL_PATH and os.path.exists(FINETUNE_MODEL_PATH):
     print(f"Loading fine-tuned model from: {FINETUNE_MODEL_PATH}")
     try:
-        finetune_model = whisper.load_model(FINETUNE_MODEL_PATH)
-        print(f"Fine-tuned model loaded on device: {finetune_model.device}")
+        mtime = checkpoint_mtime(FINETUNE_MODEL_PATH)
+        finetune_slot.install(
+            FINETUNE_MODEL_PATH,
+            Backend("finetune", whisper.load_model(FINETUNE_MODEL_PATH), "torch"),
+            mtime,
+        )
+        print(f"Fine-tuned model loaded on device: {finetune_slot.backend.device}")
     except Exception as e:
         print(f"Failed to load fine-tuned model: {e}")
 else:
     print("No fine-tuned model configured or path not found")
 
+router = Router(
+    Backend("gpu", model, "torch") if model is not None else None,
+    cpu_backend,
+    cpu_max_seconds=CPU_MAX_SECONDS,
+    gpu_queue_limit=GPU_QUEUE_LIMIT,
+)
+
+# Mel size of the standard model; None when only CTranslate2, which computes its own, serves it
+standard_whisper = model if model is not None else getattr(cpu_backend.model, "_model", None)
+if not hasattr(standard_whisper, "dims"):
+    standard_whisper = None
+STANDARD_N_MELS = standard_whisper.dims.n_mels if standard_whisper is not None else None
+
+# Audio is decoded and its mel computed before a request takes a backend lock,
+# so preparing the next request overlaps inference on the current one
+preprocessor = Preprocessor(PREPROCESS_WORKERS)
+
+# Per-stage timings of every request, served at /debug/stats
+request_stats = StatsAggregator()
+
+# Every file transcription is archived for full-text search
+transcript_store = None
+if TRANSCRIPT_DB:
+    try:
+        os.makedirs(os.path.dirname(TRANSCRIPT_DB) or ".", exist_ok=True)
+        transcript_store = TranscriptStore(TRANSCRIPT_DB)
+        print(f"Transcript store: {TRANSCRIPT_DB}")
+    except Exception as e:
+        print(f"Transcript store unavailable: {e}")
+
 # Optional: Load punctuation restoration
 punctuation_model = None
+punctuation_lock = threading.Lock()
 try:
     from deepmultilingualpunctuation import PunctuationModel
     punctuation_model = PunctuationModel()
@@ -46,6 +165,23 @@ try:
 except ImportError:
     print("Punctuation restoration not available")
 
+# Open dictation sessions, bounded by STREAM_MAX_SESSIONS
+dictation_slots = threading.BoundedSemaphore(max(STREAM_MAX_SESSIONS, 1))
+
+# Shard pools are started lazily, one per model source and version
+shard_pools = {}
+shard_pools_lock = threading.Lock()
+
+
+def get_shard_pool(model_source: str, version: int = 0) -> ShardPool:
+    """Return the replica pool for a model, starting it on first use"""
+    with shard_pools_lock:
+        key = (model_source, version)
+        if key not in shard_pools:
+            print(f"Starting shard pool: {SHARD_REPLICAS} x {model_source} on {SHARD_DEVICE}")
+            shard_pools[key] = ShardPool(model_source, SHARD_REPLICAS, SHARD_DEVICE, SHARD_THREADS)
+        return shard_pools[key]
+
 
 @app.route("/health", methods=["GET"])
 def health():
@@ -53,11 +189,98 @@ def health():
     return jsonify({
         "status": "healthy",
         "model": MODEL_NAME,
-        "finetune_available": finetune_model is not None,
-        "finetune_path": FINETUNE_MODEL_PATH if finetune_model else None,
-        "device": str(model.device),
-        "punctuation_available": punctuation_model is not None
+        "finetune_available": finetune_slot.current is not None,
+        "finetune_path": finetune_slot.current.path if finetune_slot.current else None,
+        "finetune_version": finetune_slot.current.version if finetune_slot.current else None,
+        "finetune_swap": finetune_slot.status["state"],
+        "device": router.gpu.device if router.gpu else "cpu",
+        "punctuation_available": punctuation_model is not None,
+        "shard_replicas": SHARD_REPLICAS,
+        "shard_device": SHARD_DEVICE if SHARD_REPLICAS else None,
+        "cpu_backend": cpu_backend.engine if cpu_backend else None,
+        "transcript_store": transcript_store is not None
+    })
+
+
+def request_deadline() -> float:
+    """
+    Absolute deadline (Unix time) for this request
+
+    Clients send X-Request-Deadline as Unix seconds; an absolute time passes
+    through proxies such as the control-panel gateway unchanged
+    """
+    header = request.headers.get("X-Request-Deadline")
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    return time.time() + DEFAULT_TIMEOUT
+
+
+def client_disconnected(sock) -> bool:
+    """True if the client has closed its end of the connection"""
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        return True
+
+
+def shed_if_overloaded(deadline: float) -> None:
+    """Reject before reading the upload if no backend can start in time"""
+    if deadline <= time.time():
+        raise RequestCancelled("deadline")
+    backends = [b for b in (*router.backends.values(), finetune_slot.backend) if b is not None]
+    wait = min(b.estimated_wait(0) for b in backends)
+    if time.time() + wait > deadline:
+        raise Overloaded(wait)
+
+
+@app.errorhandler(Overloaded)
+def handle_overloaded(e):
+    request_stats.count("shed")
+    response = jsonify({
+        "error": "Queue cannot meet the request deadline",
+        "retry_after": round(e.retry_after, 1),
     })
+    response.status_code = 503
+    response.headers["Retry-After"] = str(max(1, math.ceil(e.retry_after)))
+    return response
+
+
+@app.errorhandler(BrokenProcessPool)
+def handle_broken_pool(e):
+    # The pool has been restarted, so a retry is served normally
+    request_stats.count("worker_died")
+    response = jsonify({"error": "A worker process died (possibly out of memory); try again"})
+    response.status_code = 503
+    response.headers["Retry-After"] = "5"
+    return response
+
+
+@app.errorhandler(RequestCancelled)
+def handle_cancelled(e):
+    request_stats.count(f"cancelled_{e.reason}")
+    if e.reason == "deadline":
+        return jsonify({"error": "Request deadline exceeded"}), 504
+    # Nobody is listening; 499 is the conventional "client closed request" code
+    return jsonify({"error": "Client disconnected"}), 499
+
+
+def debug_requested() -> bool:
+    return (request.args.get("debug") or request.form.get("debug", "false")).lower() == "true"
+
+
+def finish_profile(profile: RequestProfile, payload: dict, debug: bool) -> dict:
+    """Close a request profile, aggregate it, and attach it to the payload if asked"""
+    report = profile.finish()
+    request_stats.record(profile)
+    if debug:
+        payload["debug"] = report
+    return payload
 
 
 @app.route("/transcribe", methods=["POST"])
@@ -70,62 +293,277 @@ def transcribe():
         - language: Optional language code (e.g., 'en', 'he')
         - restore_punctuation: Whether to apply punctuation restoration (default: true)
         - use_finetune: Whether to use fine-tuned model (default: false)
+        - sharded: Split long audio across the replica pool (default: auto,
+          i.e. when replicas are configured and audio exceeds WHISPER_SHARD_MIN_SECONDS)
+        - backend: 'gpu', 'cpu' or 'auto' (default: auto, routed by queue depth and audio length)
+        - profile: Decoding profile, 'fast', 'balanced' or 'accurate' (default: WHISPER_DEFAULT_PROFILE)
+        - archive: Keep the transcript in the searchable archive (default: true)
+        - X-Request-Deadline header: Unix time after which the result is useless
+          (default: now + WHISPER_DEFAULT_TIMEOUT). Requests that cannot meet it
+          get 503 with Retry-After; requests that pass it while queued or
+          decoding are dropped with 504
 
     Returns:
         - text: Transcribed text
         - language: Detected/specified language
         - segments: Timestamped segments (if available)
         - model_used: Which model was used for transcription
+        - backend: Which backend served the request ('gpu', 'cpu', 'finetune' or 'sharded')
+        - model_version: Fine-tuned model version used (null for the standard model)
+        - profile: Decoding profile used
+        - duration: Audio duration in seconds
+        - shards: Number of shards (sharded mode only)
+        - debug: Per-stage timings (ms), decode fallback counts, peak RSS and
+          device memory (only when debug=true is passed as a query or form field)
     """
-    if "file" not in request.files:
+    deadline = request_deadline()
+    shed_if_overloaded(deadline)
+
+    profile = RequestProfile()
+    with profile.span("upload"):
+        files = request.files
+    debug = debug_requested()
+    profile.detailed = debug
+
+    if "file" not in files:
+        profile.finish()
         return jsonify({"error": "No file provided"}), 400
 
-    file = request.files["file"]
+    file = files["file"]
     if file.filename == "":
+        profile.finish()
         return jsonify({"error": "No file selected"}), 400
 
-    # Get options
-    language = request.form.get("language", DEFAULT_LANGUAGE)
-    restore_punct = request.form.get("restore_punctuation", "true").lower() == "true"
-    use_finetune = request.form.get("use_finetune", "false").lower() == "true"
+    try:
+        payload, status = run_transcription(
+            file,
+            profile,
+            deadline,
+            language=request.form.get("language", DEFAULT_LANGUAGE),
+            restore_punct=request.form.get("restore_punctuation", "true").lower() == "true",
+            use_finetune=request.form.get("use_finetune", "false").lower() == "true",
+            sharded=request.form.get("sharded", "auto").lower(),
+            backend_pref=request.form.get("backend", "auto").lower(),
+            decoding=request.form.get("profile") or DEFAULT_PROFILE,
+            archive=request.form.get("archive", "true").lower() == "true",
+        )
+    except Exception:
+        profile.finish()
+        raise
+    return jsonify(finish_profile(profile, payload, debug)), status
+
+
+@app.route("/v1/audio/transcriptions", methods=["POST"])
+def openai_transcriptions():
+    """
+    OpenAI-compatible transcription endpoint
+
+    Accepts:
+        - file: Audio file (multipart/form-data)
+        - model: 'whisper-1' or the configured model name for the standard
+          model, 'finetune' for the fine-tuned model
+        - language: Optional language code
+        - prompt: Optional initial prompt
+        - profile: Decoding profile (extension; default: WHISPER_DEFAULT_PROFILE)
+        - archive: Keep the transcript in the searchable archive (extension; default: true)
+        - response_format: 'json' (default), 'text' or 'verbose_json'
+    """
+    deadline = request_deadline()
+    shed_if_overloaded(deadline)
+
+    profile = RequestProfile()
+    with profile.span("upload"):
+        files = request.files
+
+    if "file" not in files:
+        profile.finish()
+        return jsonify({"error": {"message": "No file provided", "type": "invalid_request_error"}}), 400
+
+    response_format = request.form.get("response_format", "json")
+    if response_format not in ("json", "text", "verbose_json"):
+        profile.finish()
+        return jsonify({"error": {
+            "message": f"Unsupported response_format: {response_format}",
+            "type": "invalid_request_error",
+        }}), 400
+
+    try:
+        payload, status = run_transcription(
+            files["file"],
+            profile,
+            deadline,
+            language=request.form.get("language") or DEFAULT_LANGUAGE,
+            restore_punct=False,
+            use_finetune=request.form.get("model", "whisper-1") == "finetune",
+            initial_prompt=request.form.get("prompt") or None,
+            decoding=request.form.get("profile") or DEFAULT_PROFILE,
+            archive=request.form.get("archive", "true").lower() == "true",
+        )
+    except Exception:
+        profile.finish()
+        raise
+    finish_profile(profile, payload, debug=False)
+    if status != 200:
+        return jsonify({"error": {"message": payload["error"], "type": "invalid_request_error"}}), status
+
+    if response_format == "text":
+        return Response(payload["text"] + "\n", mimetype="text/plain")
+    if response_format == "verbose_json":
+        return jsonify({
+            "task": "transcribe",
+            "language": payload["language"],
+            "duration": payload["duration"],
+            "text": payload["text"],
+            "segments": [
+                {"id": i, **seg} for i, seg in enumerate(payload["segments"])
+            ],
+        })
+    return jsonify({"text": payload["text"]})
 
-    # Select model
+
+def run_transcription(
+    file,
+    profile: RequestProfile,
+    deadline: float,
+    language: str = None,
+    restore_punct: bool = True,
+    use_finetune: bool = False,
+    sharded: str = "auto",
+    backend_pref: str = "auto",
+    initial_prompt: str = None,
+    decoding: str = DEFAULT_PROFILE,
+    archive: bool = True,
+) -> tuple:
+    """
+    Transcribe an uploaded file; returns (payload, HTTP status)
+
+    Raises Overloaded if the chosen backend cannot finish by the deadline, and
+    RequestCancelled if the deadline passes or the client disconnects while
+    the request is queued or decoding
+    """
+    client_socket = request.environ.get("gunicorn.socket")
+
+    def cancel_check():
+        if time.time() > deadline:
+            raise RequestCancelled("deadline")
+        if client_disconnected(client_socket):
+            raise RequestCancelled("disconnected")
+
+    if sharded == "true" and SHARD_REPLICAS < 1:
+        return {"error": "Sharded transcription not enabled (set WHISPER_SHARD_REPLICAS)"}, 400
+    if decoding not in PROFILES:
+        return {"error": f"Unknown profile: {decoding} (choose from {', '.join(PROFILES)})"}, 400
+    if backend_pref != "auto" and backend_pref not in router.backends:
+        return {"error": f"Backend not available: {backend_pref} (choose from auto, {', '.join(router.backends)})"}, 400
+
+    # Select model; a fine-tuned version stays loaded until released below
+    finetune = None
     if use_finetune:
-        if finetune_model is None:
-            return jsonify({"error": "Fine-tuned model not available"}), 400
-        active_model = finetune_model
+        finetune = finetune_slot.acquire()
+        if finetune is None:
+            return {"error": "Fine-tuned model not available"}, 400
+        n_mels = finetune.backend.model.dims.n_mels
         model_used = "finetune"
+        model_source = finetune.path
     else:
-        active_model = model
+        n_mels = STANDARD_N_MELS
         model_used = MODEL_NAME
+        model_source = MODEL_NAME
 
-    # Save uploaded file temporarily
-    suffix = Path(file.filename).suffix or ".wav"
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-        file.save(tmp.name)
-        tmp_path = tmp.name
-
+    audio = None
+    tmp_path = None
     try:
+        # Save uploaded file temporarily
+        suffix = Path(file.filename).suffix or ".wav"
+        with profile.span("upload"), tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            file.save(tmp.name)
+            tmp_path = tmp.name
+
         # Transcribe
-        options = {}
+        options = decoding_options(decoding)
         if language:
             options["language"] = language
+        if initial_prompt:
+            options["initial_prompt"] = initial_prompt
 
-        result = active_model.transcribe(tmp_path, **options)
+        # The precomputed mel only helps openai-whisper decodes: skip it for
+        # audio bound for the shard pool or the CTranslate2 CPU backend
+        mel_max_seconds = None
+        if SHARD_REPLICAS > 0 and sharded == "true":
+            n_mels = None
+        elif SHARD_REPLICAS > 0 and sharded == "auto":
+            mel_max_seconds = SHARD_MIN_SECONDS
+        if not finetune and backend_pref == "cpu" and cpu_backend and cpu_backend.engine.startswith("ctranslate2"):
+            n_mels = None
+
+        with profile.span("preprocess"):
+            audio = preprocessor.prepare(tmp_path, n_mels, mel_max_seconds)
+        # Worker-side steps; the rest of "preprocess" is waiting for a free worker
+        for step, seconds in audio.timings.items():
+            profile.spans[step] += seconds
+        # Time spent queued for a preprocess worker counts against the deadline too
+        cancel_check()
+        duration = len(audio) / SAMPLE_RATE
+        use_shards = SHARD_REPLICAS > 0 and (
+            sharded == "true" or (sharded == "auto" and duration >= SHARD_MIN_SECONDS)
+        )
+
+        if use_shards:
+            if "language" not in options:
+                with profile.span("language_detect"):
+                    detector = finetune.backend if finetune else router.gpu or router.cpu
+                    if hasattr(detector.model, "detect_language"):
+                        options["language"] = detector.detect_language(audio, deadline)
+            cancel_check()
+            with profile.span("inference"):
+                result = get_shard_pool(model_source, finetune.version if finetune else 0).transcribe(
+                    audio, options, SHARD_SECONDS, SHARD_OVERLAP
+                )
+            backend_used = "sharded"
+        else:
+            backend = finetune.backend if finetune else router.route(duration, backend_pref)
+            backend.admit(duration, deadline)
+            result = backend.transcribe(
+                audio, duration, profile=profile, deadline=deadline, cancel_check=cancel_check, **options
+            )
+            backend_used = backend.name
+
+        # Archive for search; a failure here never fails the transcription
+        if transcript_store is not None and archive:
+            if finetune is not None:
+                model_key = f"finetune:{finetune.checkpoint_id}"
+            elif backend_used == "cpu":
+                model_key = f"cpu:{CPU_MODEL_NAME}"
+            else:
+                model_key = MODEL_NAME
+            try:
+                with profile.span("store"):
+                    transcript_store.put(
+                        hash_file(tmp_path), model_key, decoding, language or "", result, duration, file.filename
+                    )
+            except Exception as e:
+                print(f"Failed to archive transcript: {e}")
 
         text = result["text"].strip()
 
         # Apply punctuation restoration if available and requested
         if punctuation_model and restore_punct and text:
             try:
-                text = punctuation_model.restore_punctuation(text)
+                with profile.span("punctuation"):
+                    # The HF fast tokenizer underneath is not thread-safe
+                    with punctuation_lock:
+                        text = punctuation_model.restore_punctuation(text)
             except Exception as e:
                 print(f"Punctuation restoration failed: {e}")
 
-        return jsonify({
+        response = {
             "text": text,
             "language": result.get("language", language),
             "model_used": model_used,
+            "backend": backend_used,
+            "model_version": finetune.version if finetune else None,
+            "profile": decoding,
+            "duration": round(duration, 3),
             "segments": [
                 {
                     "start": seg["start"],
@@ -134,9 +572,17 @@ def transcribe():
                 }
                 for seg in result.get("segments", [])
             ]
-        })
+        }
+        if use_shards:
+            response["shards"] = result["shards"]
+
+        return response, 200
 
     finally:
+        if finetune is not None:
+            finetune.release()
+        if audio is not None:
+            audio.release()
         # Clean up temp file
         try:
             os.unlink(tmp_path)
@@ -144,13 +590,265 @@ def transcribe():
             pass
 
 
+@sock.route("/ws/dictate")
+def dictate(ws):
+    """
+    Live dictation over WebSocket
+
+    Query params:
+        - language: Optional language code
+        - sample_rate: Sample rate of the incoming PCM (default: 16000)
+        - use_finetune: Whether to use fine-tuned model (default: false)
+        - profile: Decoding profile (default: WHISPER_STREAM_PROFILE, i.e. fast)
+
+    Client sends binary frames of 16-bit little-endian mono PCM, then the
+    text message "end" (or closes the socket). Server sends JSON messages:
+        - {"type": "partial", "text": ...}: unstable hypothesis, replaced by the next one
+        - {"type": "committed", "text": ..., "start": ..., "end": ...}: final text, in order
+        - {"type": "final"}: stream finished
+        - {"type": "error", "error": ...}: request rejected
+
+    When WHISPER_STREAM_MAX_SESSIONS sessions are already open the socket is
+    closed with code 1013 (try again later)
+    """
+    language = request.args.get("language", DEFAULT_LANGUAGE)
+    try:
+        sample_rate = int(request.args.get("sample_rate", SAMPLE_RATE))
+    except ValueError:
+        sample_rate = 0
+    use_finetune = request.args.get("use_finetune", "false").lower() == "true"
+    decoding = request.args.get("profile") or STREAM_PROFILE
+
+    if not 8000 <= sample_rate <= 192000:
+        ws.send(json.dumps({"type": "error", "error": "sample_rate must be an integer between 8000 and 192000"}))
+        return
+    if decoding not in PROFILES:
+        ws.send(json.dumps({"type": "error", "error": f"Unknown profile: {decoding}"}))
+        return
+    if use_finetune and finetune_slot.current is None:
+        ws.send(json.dumps({"type": "error", "error": "Fine-tuned model not available"}))
+        return
+
+    def decode(audio, duration, **options):
+        if not use_finetune:
+            return router.route(duration).transcribe(audio, duration, **options)
+        # Hold the fine-tuned version per decode, not per session, so a hot
+        # swap can retire the old weights while a dictation session is open
+        finetune = finetune_slot.acquire()
+        try:
+            return finetune.backend.transcribe(audio, duration, **options)
+        finally:
+            finetune.release()
+
+    if not dictation_slots.acquire(blocking=False):
+        ws.send(json.dumps({"type": "error", "error": "Too many dictation sessions, try again later"}))
+        ws.close(reason=1013, message="Too many dictation sessions")
+        return
+
+    try:
+        options = decoding_options(decoding)
+        if language:
+            options["language"] = language
+
+        session = DictationSession(
+            decode,
+            options,
+            min_chunk_seconds=STREAM_CHUNK_SECONDS,
+            trim_seconds=STREAM_TRIM_SECONDS,
+            max_buffer_seconds=STREAM_MAX_SECONDS,
+        )
+
+        leftover = b""
+        ended = False
+        while not ended:
+            message = ws.receive()
+            if message is None or message == "end":
+                break
+            # Take every frame that queued up during the last decode, so a decode
+            # slower than real time covers them all at once instead of falling behind
+            frames = [message]
+            while True:
+                message = ws.receive(timeout=0)
+                if message is None:
+                    break
+                if message == "end":
+                    ended = True
+                    break
+                frames.append(message)
+
+            data = leftover + b"".join(f for f in frames if isinstance(f, bytes))
+            # A sample split across frames waits for its second byte
+            cut = len(data) - len(data) % 2
+            data, leftover = data[:cut], data[cut:]
+            for event in session.feed(pcm16_to_float(data, sample_rate)):
+                ws.send(json.dumps(event))
+
+        for event in session.finish():
+            ws.send(json.dumps(event))
+    finally:
+        dictation_slots.release()
+
+
+@app.route("/debug/stats", methods=["GET"])
+def debug_stats():
+    """Per-stage latency percentiles, fallback counts and memory peaks across recent requests"""
+    return jsonify({
+        **request_stats.summary(),
+        "backends": {name: backend.stats() for name, backend in router.backends.items()},
+    })
+
+
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile():
+    """
+    Sample the live process's Python stacks
+
+    Query params:
+        - seconds: Capture duration (default: 10, max: WHISPER_PROFILE_MAX_SECONDS)
+
+    Returns collapsed stacks as text/plain, ready for flamegraph.pl or speedscope
+    """
+    try:
+        seconds = float(request.args.get("seconds", "10"))
+    except ValueError:
+        return jsonify({"error": "seconds must be a number"}), 400
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        return jsonify({"error": f"seconds must be between 0 and {PROFILE_MAX_SECONDS:g}"}), 400
+
+    return Response(sample_stacks(seconds), mimetype="text/plain")
+
+
+def admin_error():
+    """Error response for an unauthorized /admin request, or None if allowed"""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled (set WHISPER_ADMIN_TOKEN)"}), 403
+    supplied = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {ADMIN_TOKEN}".encode()):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+
+def load_finetune_backend(path: str) -> Backend:
+    return Backend("finetune", whisper.load_model(path), "torch")
+
+
+def warm_up(backend: Backend) -> None:
+    """One short decode so kernels and allocator pools are ready before traffic"""
+    backend.model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), language="en")
+
+
+def retire_finetune(old) -> None:
+    """Stop replica pools still running the retired checkpoint"""
+    with shard_pools_lock:
+        pool = shard_pools.pop((old.path, old.version), None)
+    if pool is not None:
+        pool.shutdown()
+
+
+@app.route("/admin/finetune", methods=["GET"])
+def finetune_status():
+    """Current fine-tuned model version and state of any swap in progress"""
+    error = admin_error()
+    if error:
+        return error
+    return jsonify(finetune_slot.info())
+
+
+@app.route("/admin/finetune", methods=["POST"])
+def swap_finetune():
+    """
+    Hot-swap the fine-tuned model
+
+    Accepts JSON:
+        - path: Checkpoint to load (default: WHISPER_FINETUNE_MODEL)
+
+    The checkpoint is loaded and warmed up in the background while the
+    current version keeps serving. New requests then switch to it, and the
+    old weights are freed once its in-flight requests finish. Poll
+    GET /admin/finetune for progress
+    """
+    error = admin_error()
+    if error:
+        return error
+
+    path = (request.get_json(silent=True) or {}).get("path") or FINETUNE_MODEL_PATH
+    if not path or not os.path.exists(path):
+        return jsonify({"error": f"Checkpoint not found: {path}"}), 400
+
+    if not finetune_slot.swap_async(path, load_finetune_backend, warm_up, on_retired=retire_finetune):
+        return jsonify({"error": "A swap is already in progress", **finetune_slot.info()}), 409
+    return jsonify({"status": "loading", **finetune_slot.info()}), 202
+
+
+@app.route("/profiles", methods=["GET"])
+def list_profiles():
+    """List decoding profiles and the transcribe() options each one sets"""
+    return jsonify({
+        "default": DEFAULT_PROFILE,
+        "stream_default": STREAM_PROFILE,
+        "profiles": PROFILES,
+    })
+
+
+@app.route("/transcripts/search", methods=["GET"])
+def search_transcripts():
+    """
+    Full-text search over archived transcript segments
+
+    Query params:
+        - q: Words to match (all must appear; end a word with * for prefix match)
+        - limit: Maximum segments returned (default: 20, max: 100)
+
+    Returns matching segments, best first, with start_ms/end_ms offsets into
+    their source audio
+    """
+    if transcript_store is None:
+        return jsonify({"error": "Transcript store not enabled (set WHISPER_TRANSCRIPT_DB)"}), 404
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        limit = min(max(int(request.args.get("limit", "20")), 1), 100)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    results = transcript_store.search(query, limit)
+    return jsonify({"query": query, "count": len(results), "results": results})
+
+
+@app.route("/transcripts/<int:transcript_id>", methods=["GET"])
+def get_transcript(transcript_id: int):
+    """A full archived transcript with its segments"""
+    if transcript_store is None:
+        return jsonify({"error": "Transcript store not enabled (set WHISPER_TRANSCRIPT_DB)"}), 404
+    transcript = transcript_store.transcript(transcript_id)
+    if transcript is None:
+        return jsonify({"error": "Transcript not found"}), 404
+    return jsonify(transcript)
+
+
+@app.route("/transcripts", methods=["GET"])
+def transcript_stats():
+    """Size of the transcript archive"""
+    if transcript_store is None:
+        return jsonify({"error": "Transcript store not enabled (set WHISPER_TRANSCRIPT_DB)"}), 404
+    return jsonify({"path": TRANSCRIPT_DB, **transcript_store.stats()})
+
+
 @app.route("/models", methods=["GET"])
 def list_models():
     """List available Whisper models"""
     return jsonify({
         "current": MODEL_NAME,
-        "finetune_available": finetune_model is not None,
-        "finetune_path": FINETUNE_MODEL_PATH if finetune_model else None,
+        "finetune_available": finetune_slot.current is not None,
+        "finetune_path": finetune_slot.current.path if finetune_slot.current else None,
+        "finetune_version": finetune_slot.current.version if finetune_slot.current else None,
+        "shard_replicas": SHARD_REPLICAS,
+        "backends": {
+            name: backend.stats()
+            for name, backend in {**router.backends, "finetune": finetune_slot.backend}.items()
+            if backend is not None
+        },
         "available": ["tiny", "base", "small", "medium", "large", "large-v2", "large-v3", "large-v3-turbo"]
     })
 